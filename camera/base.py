@@ -4,36 +4,241 @@ Camera backend abstractions for SmartLarva Edge.
 
 This module defines the interface that all camera backends must implement.
 A camera backend is responsible for capturing a burst of images, saving them
-to disk, computing metadata such as file size and SHA-256 checksum, and
-returning a list of ``CapturedImage`` objects.
+to disk, computing metadata such as file size and content hash, and
+returning a ``CapturedBurst`` holding that metadata column by column.
+
+The content hash defaults to SHA-256. Setting ``hash_algo: xxh3_128`` selects
+the much faster non-cryptographic XXH3 hash (requires the ``xxhash``
+package) for deployments that only need integrity checking, not collision
+resistance against an adversary.
 
 Implementations may use mock data for development/testing or interact with
 real hardware on a Raspberry Pi (e.g., via libcamera or vendor SDK).
 """
 
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Sequence
 from pathlib import Path
 import datetime
+import hashlib
+import logging
+import os
 
-@dataclass
+try:
+    import xxhash
+except ImportError:  # optional dependency
+    xxhash = None
+
+logger = logging.getLogger(__name__)
+
+HASH_ALGOS = ('sha256', 'xxh3_128')
+
+@dataclass(frozen=True)
 class CapturedImage:
-    """Represents metadata for a captured image."""
+    """Represents metadata for a captured image.
+
+    Instances are immutable and slotted (no per-instance ``__dict__``), since
+    bursts and sync queues may hold many of them.
+    """
+
+    # Declared explicitly rather than via ``dataclass(slots=True)`` to keep
+    # Python 3.9 support.
+    __slots__ = (
+        'image_index', 'local_path', 'size_bytes', 'content_hash',
+        'hash_algo', 'width_px', 'height_px', 'format', 'captured_at',
+    )
 
     image_index: int
     local_path: str
     size_bytes: int
-    sha256_hex: str
+    content_hash: str
+    hash_algo: str
     width_px: int
     height_px: int
     format: str
     captured_at: datetime.datetime
 
+@dataclass
+class CapturedBurst:
+    """Metadata for one captured burst, stored as parallel columns.
+
+    Consumers such as the database layer can bind whole columns at once
+    (e.g. ``executemany`` over ``zip(...)``) instead of reading attributes off
+    one ``CapturedImage`` per frame. ``as_list`` converts back when per-image
+    objects are more convenient.
+    """
+
+    event_local_id: int
+    captured_at: datetime.datetime
+    hash_algo: str
+    image_indices: List[int] = field(default_factory=list)
+    paths: List[str] = field(default_factory=list)
+    sizes: List[int] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    widths: List[int] = field(default_factory=list)
+    heights: List[int] = field(default_factory=list)
+    formats: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.image_indices)
+
+    @classmethod
+    def from_images(
+        cls,
+        event_local_id: int,
+        captured_at: datetime.datetime,
+        hash_algo: str,
+        images: Sequence[CapturedImage],
+    ) -> 'CapturedBurst':
+        """Build a burst from per-image metadata, preserving order."""
+        return cls(
+            event_local_id=event_local_id,
+            captured_at=captured_at,
+            hash_algo=hash_algo,
+            image_indices=[img.image_index for img in images],
+            paths=[img.local_path for img in images],
+            sizes=[img.size_bytes for img in images],
+            hashes=[img.content_hash for img in images],
+            widths=[img.width_px for img in images],
+            heights=[img.height_px for img in images],
+            formats=[img.format for img in images],
+        )
+
+    def as_list(self) -> List[CapturedImage]:
+        """Return the burst as a list of ``CapturedImage`` objects."""
+        return [
+            CapturedImage(
+                image_index=idx,
+                local_path=path,
+                size_bytes=size,
+                content_hash=content_hash,
+                hash_algo=self.hash_algo,
+                width_px=width,
+                height_px=height,
+                format=fmt,
+                captured_at=self.captured_at,
+            )
+            for idx, path, size, content_hash, width, height, fmt in zip(
+                self.image_indices, self.paths, self.sizes, self.hashes,
+                self.widths, self.heights, self.formats,
+            )
+        ]
+
+def resolve_hash_algo(hash_algo: str) -> str:
+    """Validate a configured hash algorithm name.
+
+    Falls back to ``'sha256'`` (with a warning) if ``xxh3_128`` is requested
+    but the ``xxhash`` package is not installed.
+
+    Raises:
+        ValueError: if the algorithm is not supported.
+    """
+    hash_algo = hash_algo.lower()
+    if hash_algo not in HASH_ALGOS:
+        raise ValueError(f'Unsupported hash algorithm: {hash_algo}')
+    if hash_algo == 'xxh3_128' and xxhash is None:
+        logger.warning('xxhash is not installed; falling back to sha256')
+        return 'sha256'
+    return hash_algo
+
+def new_hasher(hash_algo: str = 'sha256'):
+    """Return a fresh hash object (with ``update``/``hexdigest``) for ``hash_algo``."""
+    if hash_algo == 'xxh3_128':
+        return xxhash.xxh3_128()
+    return hashlib.sha256()
+
+def hash_file(path: str, hash_algo: str = 'sha256') -> str:
+    """Compute the hex digest of a file.
+
+    Uses ``hashlib.file_digest`` (Python 3.11+), which reads into a reusable
+    buffer and feeds OpenSSL directly instead of looping over chunks in
+    Python; older interpreters fall back to a chunked read loop.
+    """
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            digest = hashlib.file_digest(
+                f, 'sha256' if hash_algo == 'sha256' else lambda: new_hasher(hash_algo)
+            ).hexdigest()
+        else:
+            h = new_hasher(hash_algo)
+            for chunk in iter(lambda: f.read(1 << 18), b''):
+                h.update(chunk)
+            digest = h.hexdigest()
+    return digest
+
+def hash_files(paths: Sequence[str], hash_algo: str = 'sha256') -> List[str]:
+    """Compute the hex digest of each file in a burst.
+
+    Both ``hashlib`` and ``xxhash`` release the GIL while hashing large
+    buffers, so the files are hashed concurrently on a small thread pool.
+    For SHA-256, OpenSSL selects the hardware path (SHA-NI on x86, ARMv8
+    Crypto Extensions on Raspberry Pi 4/5) when the CPU supports it.
+
+    Returns:
+        List of hex digests in the same order as ``paths``.
+    """
+    if len(paths) <= 1:
+        return [hash_file(path, hash_algo) for path in paths]
+    workers = min(len(paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda path: hash_file(path, hash_algo), paths))
+
+def drop_page_cache(fd: int) -> None:
+    """Hint the kernel to evict a file's pages from the page cache.
+
+    Captured images are written once and read at most once more (for
+    upload), so keeping them cached only evicts hotter pages such as the
+    SQLite database. Only clean pages are evicted, so call this after the
+    last read of a file (its upload), not right after writing it (dirty
+    pages are merely queued for writeback). No-op on platforms without ``posix_fadvise``
+    (macOS).
+    """
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def fsync_dir(path) -> None:
+    """Flush a directory's entries to stable storage with a single ``fsync``.
+
+    Called once per burst after all files are written, so the new directory
+    entries are committed in one journal transaction rather than one per
+    file. No-op on platforms that cannot open directories (Windows).
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    dfd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(dfd)
+    finally:
+        os.close(dfd)
+
+class HashingWriter:
+    """Write-only file wrapper that hashes bytes as they are written.
+
+    Wrapping the destination file lets an encoder stream output straight to
+    disk while the content hash is computed in the same pass, so the image
+    never has to be buffered whole in memory or read back afterwards.
+    """
+
+    def __init__(self, f, hash_algo: str = 'sha256') -> None:
+        self.f = f
+        self.h = new_hasher(hash_algo)
+
+    def write(self, b) -> int:
+        self.h.update(b)
+        return self.f.write(b)
+
+    def tell(self) -> int:
+        return self.f.tell()
+
+    def flush(self) -> None:
+        self.f.flush()
+
 class CameraBackend:
     """Abstract base class for camera backends."""
 
-    def capture_burst(self, event_local_id: int, out_dir: Path, burst_size: int) -> List[CapturedImage]:
+    def capture_burst(self, event_local_id: int, out_dir: Path, burst_size: int) -> CapturedBurst:
         """Capture a burst of images.
 
         Args:
@@ -42,9 +247,12 @@ class CameraBackend:
             burst_size: Number of images to capture.
 
         Returns:
-            List of CapturedImage objects.
+            A CapturedBurst describing the saved images.
 
         Raises:
             NotImplementedError: if not implemented by subclass.
         """
         raise NotImplementedError('capture_burst must be implemented by subclasses')
+
+    def close(self) -> None:
+        """Release any resources held by the backend. The default does nothing."""
@@ -2,9 +2,15 @@
 """
 Raspberry Pi camera backend.
 
-This backend uses the libcamera tools available on Raspberry Pi OS to capture
-bursts of images. It invokes ``libcamera-still`` or ``libcamera-raw`` via
-subprocess, saving images to disk in rapid succession.
+When the ``picamera2`` library is available, this backend keeps a single
+camera pipeline open for the lifetime of the backend and captures frames as
+arrays, encoding them to JPEG itself (via libjpeg-turbo when PyTurboJPEG is
+installed, otherwise Pillow). This avoids re-spawning a process and
+re-initializing the ISP and sensor for every burst.
+
+Otherwise it falls back to the libcamera tools available on Raspberry Pi OS,
+invoking ``libcamera-still`` via subprocess and saving images to disk in rapid
+succession.
 
 Note: To use this backend, ensure that libcamera is installed and the camera
 is enabled on your Raspberry Pi. This code is designed as an example and
@@ -18,32 +24,224 @@ raise ``NotImplementedError`` when ``capture_burst`` is called.
 from __future__ import annotations
 
 import datetime
+import logging
 import os
+import queue
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
+
+try:
+    from turbojpeg import TurboJPEG, TJFLAG_PROGRESSIVE, TJPF_BGR
+except ImportError:  # optional dependency
+    TurboJPEG = None
+
+from .base import (
+    CameraBackend, CapturedBurst, CapturedImage, HashingWriter, fsync_dir, hash_files,
+    resolve_hash_algo,
+)
 
-from .base import CameraBackend, CapturedImage
+logger = logging.getLogger(__name__)
+
+
+def _pin_current_thread(cores) -> None:
+    """Restrict the calling thread to ``cores`` (Linux only; otherwise a no-op)."""
+    if cores:
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as exc:
+            logger.debug('Could not set CPU affinity to %s: %s', cores, exc)
 
 
 class RpiCamera(CameraBackend):
     """Camera backend using libcamera tools on Raspberry Pi."""
 
-    def __init__(self, image_width: int = 4056, image_height: int = 3040, quality: int = 90) -> None:
+    def __init__(
+        self,
+        image_width: int = 4056,
+        image_height: int = 3040,
+        quality: int = 85,
+        hash_algo: str = 'sha256',
+        subsampling: int = 2,
+        optimize: bool = False,
+        progressive: bool = False,
+    ) -> None:
         self.image_width = image_width
         self.image_height = image_height
         self.quality = quality
+        # Encoder settings for frames encoded in-process (picamera2 path),
+        # matching MockCamera's. Subsampling: 0 = 4:4:4, 1 = 4:2:2, 2 = 4:2:0.
+        # TurboJPEG has no separate Huffman-optimization switch, so optimize
+        # only affects Pillow; progressive output is always optimized there.
+        # libcamera-still has no options for these and always writes
+        # baseline 4:2:0 JPEGs, so only quality reaches the fallback.
+        self.subsampling = subsampling
+        self.optimize = optimize
+        self.progressive = progressive
+        self.hash_algo = resolve_hash_algo(hash_algo)
+        self._tj = None
+        self._picam2 = None
+        try:
+            from picamera2 import Picamera2  # type: ignore
+        except ImportError:
+            return
+        try:
+            picam2 = Picamera2()
+            picam2.configure(picam2.create_still_configuration(
+                main={'size': (image_width, image_height), 'format': 'RGB888'},
+            ))
+            picam2.start()
+        except Exception as exc:
+            logger.warning('picamera2 unavailable, falling back to libcamera-still: %s', exc)
+            return
+        self._picam2 = picam2
+        # Leave one core to the capture thread; the rest encode frames. On
+        # Linux, pin them apart (capture on the first core, which also
+        # services the camera IRQs) to avoid cross-core migration.
+        self._capture_cores = None
+        self._encoder_cores = None
+        if hasattr(os, 'sched_getaffinity'):
+            available = os.sched_getaffinity(0)
+            if len(available) > 1:
+                self._capture_cores = {min(available)}
+                self._encoder_cores = available - self._capture_cores
+        self._encoder_workers = max(1, (os.cpu_count() or 1) - 1)
+        self._encoder = ThreadPoolExecutor(
+            max_workers=self._encoder_workers,
+            thread_name_prefix='RpiEncoder',
+            initializer=_pin_current_thread,
+            initargs=(self._encoder_cores,),
+        )
+        if TurboJPEG is not None:
+            try:
+                self._tj = TurboJPEG()
+            except Exception:
+                self._tj = None
+
+    def close(self) -> None:
+        """Stop and release the persistent camera pipeline, if any."""
+        if self._picam2 is not None:
+            self._encoder.shutdown(wait=True)
+            self._picam2.stop()
+            self._picam2.close()
+            self._picam2 = None
+
+    def _save_frame(self, arr, path: str) -> Tuple[int, str]:
+        """Encode a captured frame as JPEG straight to disk.
+
+        ``RGB888`` frames from picamera2 are laid out as B, G, R bytes.
 
-    def _compute_sha256(self, path: str) -> str:
-        import hashlib
-        h = hashlib.sha256()
-        with open(path, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                h.update(chunk)
-        return h.hexdigest()
+        Returns:
+            Tuple of (size in bytes, content hash hex digest) of the written file.
+        """
+        with open(path, 'wb') as f:
+            hw = HashingWriter(f, self.hash_algo)
+            if self._tj is not None:
+                hw.write(self._tj.encode(
+                    arr,
+                    quality=self.quality,
+                    pixel_format=TJPF_BGR,
+                    jpeg_subsample=self.subsampling,
+                    flags=TJFLAG_PROGRESSIVE if self.progressive else 0,
+                ))
+            else:
+                from PIL import Image
+                Image.fromarray(arr[..., ::-1]).save(
+                    hw,
+                    format='JPEG',
+                    quality=self.quality,
+                    subsampling=self.subsampling,
+                    optimize=self.optimize,
+                    progressive=self.progressive,
+                )
+            return f.tell(), hw.h.hexdigest()
+
+    def _capture_burst_picamera2(
+        self, event_local_id: int, out_dir: Path, burst_size: int, now: datetime.datetime
+    ) -> CapturedBurst:
+        """Capture a burst from the already-running picamera2 pipeline.
+
+        A capture thread pulls frames from the camera into a small bounded
+        queue while encoder workers drain it, so frame ``k`` is encoded,
+        hashed and written while frame ``k + 1`` is being exposed. If any
+        frame fails to capture or encode, the frames already written are
+        removed before the error is raised.
+        """
+        frames: queue.Queue = queue.Queue(maxsize=2)
+        workers = min(self._encoder_workers, burst_size)
+        capture_errors: List[BaseException] = []
+        written: List[Path] = []  # every file opened for writing, for cleanup
+
+        def _capture() -> None:
+            _pin_current_thread(self._capture_cores)
+            try:
+                for idx in range(burst_size):
+                    frames.put((idx, self._picam2.capture_array()))
+            except BaseException as exc:
+                capture_errors.append(exc)
+            finally:
+                for _ in range(workers):
+                    frames.put(None)
 
-    def capture_burst(self, event_local_id: int, out_dir: Path, burst_size: int) -> List[CapturedImage]:
-        """Capture a burst using libcamera-still.
+        def _encode() -> List[CapturedImage]:
+            results: List[CapturedImage] = []
+            error = None
+            while True:
+                item = frames.get()
+                if item is None:
+                    break
+                if error is not None:
+                    # Keep draining so the capture thread never blocks on a full queue
+                    continue
+                idx, arr = item
+                try:
+                    path = out_dir / f'{event_local_id:08d}_{idx:03d}.jpg'
+                    written.append(path)
+                    size_bytes, content_hash = self._save_frame(arr, str(path))
+                    height_px, width_px = arr.shape[:2]
+                    results.append(CapturedImage(
+                        image_index=idx,
+                        local_path=str(path),
+                        size_bytes=size_bytes,
+                        content_hash=content_hash,
+                        hash_algo=self.hash_algo,
+                        width_px=width_px,
+                        height_px=height_px,
+                        format='jpg',
+                        captured_at=now,
+                    ))
+                except Exception as exc:
+                    error = exc
+            if error is not None:
+                raise error
+            return results
+
+        if burst_size <= 0:
+            return CapturedBurst(event_local_id, now, self.hash_algo)
+        capture_thread = threading.Thread(target=_capture, name='RpiCapture', daemon=True)
+        capture_thread.start()
+        futures = [self._encoder.submit(_encode) for _ in range(workers)]
+        capture_thread.join()
+        wait(futures)
+        try:
+            captured = [img for future in futures for img in future.result()]
+            if capture_errors:
+                raise RuntimeError(f'picamera2 capture failed: {capture_errors[0]}')
+        except BaseException:
+            for path in written:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            raise
+        captured.sort(key=lambda img: img.image_index)
+        fsync_dir(out_dir)
+        return CapturedBurst.from_images(event_local_id, now, self.hash_algo, captured)
+
+    def capture_burst(self, event_local_id: int, out_dir: Path, burst_size: int) -> CapturedBurst:
+        """Capture a burst using picamera2, or libcamera-still as a fallback.
 
         Args:
             event_local_id: Local ID for the capture event.
@@ -51,11 +249,17 @@ class RpiCamera(CameraBackend):
             burst_size: Number of images.
 
         Returns:
-            List of ``CapturedImage`` objects.
+            ``CapturedBurst`` describing the saved images.
 
         Raises:
             RuntimeError: if capturing fails.
         """
+        if self._picam2 is not None:
+            # Ensure output directory exists
+            os.makedirs(out_dir, exist_ok=True)
+            now = datetime.datetime.now(datetime.timezone.utc)
+            return self._capture_burst_picamera2(event_local_id, out_dir, burst_size, now)
+
         # Build output filename pattern
         pattern = str(out_dir / f'{event_local_id:08d}_%03d.jpg')
         cmd = [
@@ -70,6 +274,8 @@ class RpiCamera(CameraBackend):
         ]
         # Ensure output directory exists
         os.makedirs(out_dir, exist_ok=True)
+        # All frames share the burst's capture timestamp
+        now = datetime.datetime.now(datetime.timezone.utc)
         try:
             result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         except FileNotFoundError:
@@ -77,24 +283,25 @@ class RpiCamera(CameraBackend):
         except subprocess.CalledProcessError as exc:
             raise RuntimeError(f'libcamera-still failed: {exc.stderr.decode().strip()}')
 
-        captured: List[CapturedImage] = []
-        # libcamera-still names files starting at 000.jpg
+        # libcamera-still names files starting at 000.jpg. One stat per frame
+        # gives both existence and size; the shared image directory is never
+        # listed, since it can hold every image within the retention window.
+        burst = CapturedBurst(event_local_id, now, self.hash_algo)
         for idx in range(burst_size):
-            filename = f'{event_local_id:08d}_{idx:03d}.jpg'
-            path = out_dir / filename
-            if not path.exists():
+            path = str(out_dir / f'{event_local_id:08d}_{idx:03d}.jpg')
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
                 continue
-            size_bytes = os.path.getsize(path)
-            sha256_hex = self._compute_sha256(str(path))
-            # We don't attempt to read image dimensions here; width/height could be None
-            captured.append(CapturedImage(
-                image_index=idx,
-                local_path=str(path),
-                size_bytes=size_bytes,
-                sha256_hex=sha256_hex,
-                width_px=self.image_width,
-                height_px=self.image_height,
-                format='jpg',
-                captured_at=datetime.datetime.utcnow(),
-            ))
-        return captured
+            burst.image_indices.append(idx)
+            burst.paths.append(path)
+            burst.sizes.append(st.st_size)
+        fsync_dir(out_dir)
+
+        # Hash the whole burst as one concurrent batch
+        burst.hashes = hash_files(burst.paths, self.hash_algo)
+        # We don't attempt to read image dimensions here; the configured size is reported
+        burst.widths = [self.image_width] * len(burst)
+        burst.heights = [self.image_height] * len(burst)
+        burst.formats = ['jpg'] * len(burst)
+        return burst
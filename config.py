@@ -22,6 +22,9 @@ cleanup_interval: 3600      # seconds between cleanup runs
 retention_days: 30
 camera_backend: "rpi"       # "mock" on development machines
 sensor_enabled: true
+hash_algo: "sha256"         # or "xxh3_128" (faster, non-cryptographic)
+mock_annotate: true         # draw event/index text on mock camera frames
+compress_metadata: false    # gzip metadata uploads (server must accept it)
 log_file: "./edge_data/edge.log"
 ```
 
@@ -35,11 +38,18 @@ config = Config.from_yaml('config/pi.yaml')
 
 from __future__ import annotations
 
+import copy
 import os
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import yaml
 
+# Prefer the libyaml C bindings; fall back to the pure-Python loader.
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Parsed YAML keyed by (path, size, mtime_ns) so unchanged files aren't re-parsed.
+_CONFIG_CACHE: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+
 
 @dataclass
 class Config:
@@ -57,21 +67,56 @@ class Config:
     retention_days: int = 30
     camera_backend: str = 'mock'
     sensor_enabled: bool = False
+    hash_algo: str = 'sha256'  # image content hash: 'sha256' or 'xxh3_128'
+    mock_annotate: bool = True  # annotate mock camera frames with event/index text
+    compress_metadata: bool = False  # gzip metadata upload bodies
     log_file: str = './edge.log'
 
     extra: Dict[str, Any] = field(default_factory=dict)
 
+    def __post_init__(self) -> None:
+        """Coerce numeric settings to ``int`` once, e.g. when quoted in YAML.
+
+        Raises:
+            ValueError: if a numeric setting is not a whole number, or an
+                interval is not positive.
+        """
+        for name in ('burst_size', 'capture_interval', 'heartbeat_interval',
+                     'sync_interval', 'cleanup_interval', 'retention_days'):
+            value = getattr(self, name)
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} must be a whole number, got {value!r}')
+            if not number.is_integer():
+                raise ValueError(f'{name} must be a whole number, got {value!r}')
+            if name.endswith('_interval') and number <= 0:
+                raise ValueError(f'{name} must be positive, got {value!r}')
+            object.__setattr__(self, name, int(number))
+
     @classmethod
     def from_yaml(cls, path: str) -> 'Config':
         """Load configuration from a YAML file.
 
+        Parsed contents are memoized by file size and modification time, so
+        reloading an unchanged file does not re-parse it. Each call works on
+        its own copy, so mutating a returned ``Config`` (including nested
+        values in ``extra``) never leaks into later loads.
+
         Raises:
             FileNotFoundError: if the YAML file cannot be found.
             yaml.YAMLError: if the YAML file is invalid.
             KeyError: if required keys are missing.
+            ValueError: if a numeric setting is invalid.
         """
-        with open(path, 'r') as f:
-            data = yaml.safe_load(f)
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns)
+        data = _CONFIG_CACHE.get(key)
+        if data is None:
+            with open(path, 'r') as f:
+                data = yaml.load(f, Loader=_YamlLoader)
+            _CONFIG_CACHE[key] = data
+        data = copy.deepcopy(data)
 
         # Basic validation of required keys
         required_keys = ['device_id', 'base_url']
@@ -92,6 +137,9 @@ class Config:
             retention_days=data.get('retention_days', 30),
             camera_backend=data.get('camera_backend', 'mock'),
             sensor_enabled=bool(data.get('sensor_enabled', False)),
+            hash_algo=data.get('hash_algo', 'sha256'),
+            mock_annotate=bool(data.get('mock_annotate', True)),
+            compress_metadata=bool(data.get('compress_metadata', False)),
             log_file=data.get('log_file', './edge.log'),
             extra={k: v for k, v in data.items() if k not in cls.__annotations__},
         )
@@ -101,15 +149,8 @@ class Config:
 
         Creates directories as needed. This method is idempotent.
         """
-        # Create directory for DB file if necessary
         db_dir = os.path.dirname(self.db_path)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-
-        if not os.path.exists(self.image_dir):
-            os.makedirs(self.image_dir, exist_ok=True)
-
-        # Create directory for log file
         log_dir = os.path.dirname(self.log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir, exist_ok=True)
+        for d in (db_dir, self.image_dir, log_dir):
+            if d:
+                os.makedirs(d, exist_ok=True)
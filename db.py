@@ -7,9 +7,14 @@ creation of tables, insertion of records, updates, and queries. It also
 defines dataclasses representing core entities: crates, events, images and
 sensor readings.
 
-All database operations are executed in a thread-safe manner by serializing
-through a single connection with ``check_same_thread=False`` and using
-``threading.Lock`` if accessed from multiple threads.
+Each thread gets its own SQLite connection (see ``Database.conn``), so reads
+in one loop run concurrently with writes in another. Write transactions are
+still serialized with a ``threading.Lock``, since SQLite admits a single
+writer at a time.
+
+The database runs in WAL mode with ``synchronous=NORMAL``, so readers (e.g.
+the sync loop's queries) do not block the capture loop's inserts and each
+commit avoids a full fsync.
 
 The schema corresponds to the "SmartLarva Edge–Cloud Sync Protocol", using
 local identifiers on the edge device. The tables and columns are defined
@@ -20,12 +25,29 @@ The ``Database`` class ensures that tables are created on initialization.
 
 from __future__ import annotations
 
+import itertools
 import sqlite3
 import threading
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Dict, Optional, List, Sequence, Tuple
 import os
 
+# Hot insert statements, shared so every call binds the same SQL text and hits
+# the connection's prepared-statement cache instead of re-parsing.
+_INSERT_EVENT_SQL = """INSERT INTO capture_events_local
+    (event_id, crate_id, camera_name, captured_at, burst_size, uploaded)
+    VALUES (?, ?, ?, ?, ?, ?)"""
+
+_INSERT_IMAGE_SQL = """INSERT INTO images_local
+    (event_local_id, image_index, local_path, captured_at,
+     size_bytes, sha256_hex, width_px, height_px, format,
+     metadata_uploaded, uploaded, local_exists, corrupted, hash_algo)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+_INSERT_SENSOR_READING_SQL = """INSERT INTO sensor_readings_local
+    (reading_id, crate_id, recorded_at, temperature_c, humidity_pct, uploaded)
+    VALUES (?, ?, ?, ?, ?, ?)"""
+
 @dataclass
 class CapturedImageRecord:
     id: Optional[int]
@@ -42,6 +64,9 @@ class CapturedImageRecord:
     uploaded: int = 0
     local_exists: int = 1
     corrupted: int = 0
+    # Algorithm of ``sha256_hex``; the column keeps its original name but
+    # holds whichever content hash the camera backend was configured with.
+    hash_algo: str = 'sha256'
 
 @dataclass
 class CaptureEventRecord:
@@ -88,15 +113,49 @@ class Database:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
 
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        # Row factory returns dict-like row objects
-        self.conn.row_factory = sqlite3.Row
         self.lock = threading.Lock()
+        # One connection per thread, so WAL readers in one loop do not queue
+        # behind statements issued by another; all are tracked for close().
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self._create_tables()
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.new_connection()
+        return conn
+
+    def new_connection(self) -> sqlite3.Connection:
+        """Open a new configured connection to the database.
+
+        The connection is closed by ``close()``. ``check_same_thread`` is
+        disabled only so that ``close()`` may run on another thread.
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        # Row factory returns dict-like row objects
+        conn.row_factory = sqlite3.Row
+        self._configure_connection(conn)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _configure_connection(conn: sqlite3.Connection) -> None:
+        """Apply performance pragmas to a freshly opened connection."""
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA mmap_size=134217728')
+        conn.execute('PRAGMA cache_size=-8000')
+
     def _create_tables(self) -> None:
         """Create tables if they do not already exist."""
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.executescript("""
             CREATE TABLE IF NOT EXISTS crates_local (
                 id INTEGER PRIMARY KEY NOT NULL,
@@ -132,6 +191,7 @@ class Database:
                 uploaded INTEGER NOT NULL DEFAULT 0,
                 local_exists INTEGER NOT NULL DEFAULT 1,
                 corrupted INTEGER NOT NULL DEFAULT 0,
+                hash_algo TEXT NOT NULL DEFAULT 'sha256',
                 UNIQUE(event_local_id, image_index),
                 FOREIGN KEY(event_local_id) REFERENCES capture_events_local(event_id)
             );
@@ -151,6 +211,12 @@ class Database:
                 value TEXT NOT NULL
             );
             """)
+            # Databases created before hash_algo was introduced lack the column
+            columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(images_local)")}
+            if 'hash_algo' not in columns:
+                self.conn.execute(
+                    "ALTER TABLE images_local ADD COLUMN hash_algo TEXT NOT NULL DEFAULT 'sha256'"
+                )
 
     def insert_crate(self, record: CrateRecord) -> int:
         """Insert a crate record (with user-defined ID) and return its ID.
@@ -169,7 +235,7 @@ class Database:
         Returns:
             The integer primary key ID of the crate row.
         """
-        with self.conn:
+        with self.lock, self.conn:
             # Always attempt to insert the crate using the provided ID.
             self.conn.execute(
                 """
@@ -217,30 +283,37 @@ class Database:
 
     def insert_event(self, record: CaptureEventRecord) -> None:
         """Insert a capture event record."""
-        with self.conn:
-            self.conn.execute(
-                """INSERT INTO capture_events_local
-                       (event_id, crate_id, camera_name, captured_at, burst_size, uploaded)
-                       VALUES (?, ?, ?, ?, ?, ?)""",
-                (
-                    record.event_id,
-                    record.crate_id,
-                    record.camera_name,
-                    record.captured_at,
-                    record.burst_size,
-                    record.uploaded,
-                ),
-            )
+        with self.lock, self.conn:
+            self._insert_event(record)
+
+    def _insert_event(self, record: CaptureEventRecord) -> None:
+        """Execute the event insert; the caller owns the transaction."""
+        self.conn.execute(
+            _INSERT_EVENT_SQL,
+            (
+                record.event_id,
+                record.crate_id,
+                record.camera_name,
+                record.captured_at,
+                record.burst_size,
+                record.uploaded,
+            ),
+        )
 
     def insert_image(self, record: CapturedImageRecord) -> None:
         """Insert an image record."""
-        with self.conn:
-            self.conn.execute(
-                """INSERT INTO images_local
-                       (event_local_id, image_index, local_path, captured_at,
-                        size_bytes, sha256_hex, width_px, height_px, format,
-                        metadata_uploaded, uploaded, local_exists, corrupted)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        self.insert_images_bulk([record])
+
+    def insert_images_bulk(self, records: Sequence[CapturedImageRecord]) -> None:
+        """Insert several image records in a single transaction."""
+        with self.lock, self.conn:
+            self._insert_images(records)
+
+    def _insert_images(self, records: Sequence[CapturedImageRecord]) -> None:
+        """Execute the image inserts; the caller owns the transaction."""
+        self.conn.executemany(
+            _INSERT_IMAGE_SQL,
+            [
                 (
                     record.event_local_id,
                     record.image_index,
@@ -255,29 +328,53 @@ class Database:
                     record.uploaded,
                     record.local_exists,
                     record.corrupted,
-                ),
-            )
+                    record.hash_algo,
+                )
+                for record in records
+            ],
+        )
 
     def insert_sensor_reading(self, record: SensorReadingRecord) -> None:
         """Insert a sensor reading record."""
-        with self.conn:
-            self.conn.execute(
-                """INSERT INTO sensor_readings_local
-                       (reading_id, crate_id, recorded_at, temperature_c, humidity_pct, uploaded)
-                       VALUES (?, ?, ?, ?, ?, ?)""",
-                (
-                    record.reading_id,
-                    record.crate_id,
-                    record.recorded_at,
-                    record.temperature_c,
-                    record.humidity_pct,
-                    record.uploaded,
-                ),
-            )
+        with self.lock, self.conn:
+            self._insert_sensor_reading(record)
+
+    def _insert_sensor_reading(self, record: SensorReadingRecord) -> None:
+        """Execute the sensor reading insert; the caller owns the transaction."""
+        self.conn.execute(
+            _INSERT_SENSOR_READING_SQL,
+            (
+                record.reading_id,
+                record.crate_id,
+                record.recorded_at,
+                record.temperature_c,
+                record.humidity_pct,
+                record.uploaded,
+            ),
+        )
+
+    def insert_capture(
+        self,
+        event: CaptureEventRecord,
+        images: Sequence[CapturedImageRecord],
+        reading: Optional[SensorReadingRecord] = None,
+    ) -> None:
+        """Insert a capture event, its images and an optional sensor reading atomically.
+
+        Everything is written in one ``BEGIN IMMEDIATE`` transaction, so an
+        event is either fully recorded or not at all, and the whole capture
+        costs a single commit instead of one per row.
+        """
+        with self.lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self._insert_event(event)
+            self._insert_images(images)
+            if reading is not None:
+                self._insert_sensor_reading(reading)
 
     def mark_event_uploaded(self, event_id: int) -> None:
         """Mark a capture event metadata as uploaded."""
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(
                 "UPDATE capture_events_local SET uploaded = 1 WHERE event_id = ?",
                 (event_id,),
@@ -285,7 +382,7 @@ class Database:
 
     def mark_image_metadata_uploaded(self, event_local_id: int) -> None:
         """Mark all images for an event as having metadata uploaded."""
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(
                 "UPDATE images_local SET metadata_uploaded = 1 WHERE event_local_id = ?",
                 (event_local_id,),
@@ -293,7 +390,7 @@ class Database:
 
     def mark_image_uploaded(self, event_local_id: int, image_index: int) -> None:
         """Mark a specific image binary as uploaded."""
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(
                 """UPDATE images_local
                        SET uploaded = 1
@@ -303,7 +400,7 @@ class Database:
 
     def mark_reading_uploaded(self, reading_id: int) -> None:
         """Mark a sensor reading as uploaded."""
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(
                 "UPDATE sensor_readings_local SET uploaded = 1 WHERE reading_id = ?",
                 (reading_id,),
@@ -311,7 +408,7 @@ class Database:
 
     def mark_image_corrupted(self, image_id: int) -> None:
         """Mark an image as corrupted (upload failed)."""
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(
                 "UPDATE images_local SET corrupted = 1 WHERE id = ?",
                 (image_id,),
@@ -343,6 +440,38 @@ class Database:
         )
         return cursor.fetchall()
 
+    def get_unsynced_events_with_images(
+        self, limit: int = 10
+    ) -> Dict[int, Tuple[sqlite3.Row, List[sqlite3.Row]]]:
+        """Return unsynced events together with their images in one query.
+
+        Replaces one ``get_images_for_event`` round-trip per event. The
+        ``LIMIT`` applies to events, not joined rows, so every event comes
+        back with all of its images.
+
+        Returns:
+            Mapping of ``event_id`` to ``(event_row, image_rows)`` in event
+            order. Each joined row carries the event columns plus the image's
+            ``image_index``, ``size_bytes``, ``sha256_hex``, ``hash_algo``,
+            ``width_px``, ``height_px`` and ``format``; events without images
+            map to an empty list.
+        """
+        cursor = self.conn.execute(
+            """SELECT e.*, i.image_index, i.size_bytes, i.sha256_hex, i.hash_algo,
+                      i.width_px, i.height_px, i.format
+                   FROM (SELECT * FROM capture_events_local
+                             WHERE uploaded = 0 ORDER BY event_id LIMIT ?) AS e
+                   LEFT JOIN images_local AS i ON i.event_local_id = e.event_id
+                   ORDER BY e.event_id, i.image_index""",
+            (limit,),
+        )
+        grouped: Dict[int, Tuple[sqlite3.Row, List[sqlite3.Row]]] = {}
+        for event_id, rows in itertools.groupby(cursor, key=lambda row: row['event_id']):
+            rows = list(rows)
+            images = [row for row in rows if row['image_index'] is not None]
+            grouped[event_id] = (rows[0], images)
+        return grouped
+
     def get_sensor_readings(self, uploaded: int = 0, limit: int = 10):
         """Return sensor readings filtered by upload status."""
         cursor = self.conn.execute(
@@ -353,7 +482,7 @@ class Database:
 
     def set_state_value(self, key: str, value: str) -> None:
         """Store or update a state value (e.g., safe delete watermark)."""
-        with self.conn:
+        with self.lock, self.conn:
             self.conn.execute(
                 "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
                 (key, value),
@@ -389,12 +518,19 @@ class Database:
 
     def mark_image_deleted(self, image_id: int) -> None:
         """Mark an image as deleted locally."""
-        with self.conn:
-            self.conn.execute(
+        self.mark_images_deleted([image_id])
+
+    def mark_images_deleted(self, image_ids: Sequence[int]) -> None:
+        """Mark several images as deleted locally in a single transaction."""
+        with self.lock, self.conn:
+            self.conn.executemany(
                 "UPDATE images_local SET local_exists = 0 WHERE id = ?",
-                (image_id,),
+                [(image_id,) for image_id in image_ids],
             )
 
     def close(self) -> None:
-        """Close the database connection."""
-        self.conn.close()
+        """Close every connection opened by this database."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
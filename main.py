@@ -19,12 +19,15 @@ from __future__ import annotations
 import argparse
 import datetime
 import logging
+import logging.handlers
+import queue
 import signal
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 import os  # Needed for file operations in cleanup loop
 
@@ -36,7 +39,7 @@ from .camera.rpi_camera import RpiCamera
 from .sensors.mock_sensors import MockSensor
 # Note: DHT22 sensor is imported lazily inside _init_sensor to avoid
 # import errors on platforms without the library.
-from .sync.client import SyncClient
+from .sync.client import BufferPool, SyncClient
 
 
 class SmartLarvaEdge:
@@ -46,6 +49,8 @@ class SmartLarvaEdge:
         self.config = config
         # Ensure directories exist
         config.ensure_paths()
+        # Resolved once; the capture loop reuses it for every burst
+        self._image_dir = Path(config.image_dir).resolve()
 
         # Initialize logging
         self._setup_logging()
@@ -56,39 +61,74 @@ class SmartLarvaEdge:
         # configuration does not provide a ``crate`` section, a default crate
         # will be created using the label 'default_crate'.
         self.crate_id = self._ensure_crate()
+        # Config-derived constants read by the loops on every iteration
+        self._camera_name = config.extra.get('camera_name', 'camera_0')
+        self._device_id = config.device_id
+        self._burst_size = config.burst_size
+        self._retention_days = config.retention_days
+        self._capture_interval = config.capture_interval
+        self._heartbeat_interval = config.heartbeat_interval
+        self._sync_interval = config.sync_interval
+        self._cleanup_interval = config.cleanup_interval
         # Initialize hardware backends
         self.camera: CameraBackend = self._init_camera()
         self.sensor = self._init_sensor()
-        self.sync_client = SyncClient(base_url=config.base_url, device_id=config.device_id)
+        self.sync_client = SyncClient(
+            base_url=config.base_url,
+            device_id=config.device_id,
+            compress_metadata=config.compress_metadata,
+            buffer_pool=BufferPool(),
+        )
         # Generate counters for local IDs
         self._event_counter = self._get_max_id('capture_events_local', 'event_id')
         self._reading_counter = self._get_max_id('sensor_readings_local', 'reading_id')
+        # Highest event ID actually recorded in the DB; read by the heartbeat
+        # loop instead of querying the table each time.
+        self._last_event_id = self._event_counter
 
         self._stop_event = threading.Event()
+        self._stopped = False
         self._threads: list[threading.Thread] = []
+        # Runs the independent uploads of each sync round concurrently; capped
+        # so the Pi's NIC and CPU are not saturated.
+        self._sync_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='Sync')
 
     def _setup_logging(self) -> None:
         """Configure logging to file and console."""
         logger = logging.getLogger()
         logger.setLevel(logging.INFO)
+        # Skip per-record process lookups the format never uses; thread info
+        # stays on because the format includes %(threadName)s.
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
         formatter = logging.Formatter(
             '%(asctime)s [%(levelname)s] %(threadName)s - %(message)s'
         )
-        # File handler
-        fh = logging.FileHandler(self.config.log_file)
+        # Plain string formatting for milliseconds ('2025-01-01 12:00:00.123')
+        formatter.default_msec_format = '%s.%03d'
+        # File handler, rotated so long-running deployments cannot fill the disk
+        fh = logging.handlers.RotatingFileHandler(
+            self.config.log_file, maxBytes=10 * 1024 * 1024, backupCount=5
+        )
         fh.setFormatter(formatter)
-        logger.addHandler(fh)
         # Console handler
         ch = logging.StreamHandler(sys.stdout)
         ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        # Loops only enqueue records; a listener thread does the formatting
+        # and I/O, so slow writes never stall capture or sync.
+        log_queue: queue.Queue = queue.Queue(-1)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, fh, ch, respect_handler_level=True
+        )
+        self._log_listener.start()
 
     def _init_camera(self) -> CameraBackend:
         """Instantiate the camera backend based on configuration."""
         if self.config.camera_backend == 'mock':
-            return MockCamera()
+            return MockCamera(annotate=self.config.mock_annotate, hash_algo=self.config.hash_algo)
         elif self.config.camera_backend == 'rpi':
-            return RpiCamera()
+            return RpiCamera(hash_algo=self.config.hash_algo)
         else:
             raise ValueError(f'Unknown camera backend: {self.config.camera_backend}')
 
@@ -117,15 +157,15 @@ class SmartLarvaEdge:
         if backend == 'mock':
             return MockSensor()
         if backend == 'dht22':
-            # Lazy import to avoid missing Adafruit_DHT on non-Pi systems
+            from .sensors.dht22 import DHT22Sensor
+            # Determine GPIO pin from config
+            pin = self.config.extra.get('dht22_pin', 4)
+            # Adafruit_DHT is imported when the sensor is created
             try:
-                from .sensors.dht22 import DHT22Sensor  # type: ignore
-            except Exception:
+                return DHT22Sensor(pin=pin)
+            except ImportError:
                 # Fallback to mock if the real sensor library is unavailable
                 return MockSensor()
-            # Determine GPIO pin from config
-            pin = self.config.extra.get('dht22_pin', 4)
-            return DHT22Sensor(pin=pin)
         # Unknown backend -> fallback to mock
         return MockSensor()
 
@@ -182,16 +222,59 @@ class SmartLarvaEdge:
 
     def _get_max_id(self, table: str, column: str) -> int:
         """Get the current maximum ID from a table/column."""
+        # ORDER BY ... DESC LIMIT 1 is answered by a single descent of the
+        # primary-key index.
         row = self.db.conn.execute(
-            f'SELECT MAX({column}) as max_id FROM {table}'
+            f'SELECT {column} AS max_id FROM {table} ORDER BY {column} DESC LIMIT 1'
         ).fetchone()
-        max_id = row['max_id']
-        return max_id if max_id is not None else 0
+        return row['max_id'] if row is not None else 0
+
+    def _wait_next(self, deadline: float, interval: float) -> float:
+        """Wait for the next period of a loop and return its deadline.
+
+        Deadlines advance by ``interval`` on the monotonic clock, so a loop
+        keeps a steady cadence regardless of how long its body takes. If the
+        body overran a whole period, the schedule restarts from now instead
+        of running back-to-back iterations to catch up.
+        """
+        deadline += interval
+        now = time.monotonic()
+        if deadline < now:
+            deadline = now
+        self._stop_event.wait(deadline - now)
+        return deadline
+
+    def _read_sensor(self, crate_id: int) -> Optional[SensorReadingRecord]:
+        """Take a sensor reading, if a sensor is available.
+
+        Returns:
+            The reading as a record ready for insertion, or None if there is
+            no sensor or the read failed (the failure is logged, so a flaky
+            sensor never prevents a capture from being recorded).
+        """
+        if not self.sensor:
+            return None
+        self._reading_counter += 1
+        reading_id = self._reading_counter
+        try:
+            reading = self.sensor.read(crate_id=crate_id, reading_id=reading_id)
+        except Exception as exc:
+            logging.warning('Sensor read failed: %s', exc)
+            return None
+        return SensorReadingRecord(
+            reading_id=reading.reading_id,
+            crate_id=reading.crate_id,
+            recorded_at=reading.recorded_at.isoformat(),
+            temperature_c=reading.temperature_c,
+            humidity_pct=reading.humidity_pct,
+            uploaded=0,
+        )
 
     # Loop implementations
 
     def capture_loop(self) -> None:
         """Periodically capture images and sensor readings."""
+        deadline = time.monotonic()
         while not self._stop_event.is_set():
             try:
                 # Determine new event ID
@@ -199,143 +282,169 @@ class SmartLarvaEdge:
                 event_id = self._event_counter
                 # Use the pre-resolved crate id
                 crate_id = self.crate_id
-                # Timestamp for the event
-                captured_at = datetime.datetime.utcnow().isoformat()
-                # Capture sensor reading if sensor available
-                if self.sensor:
-                    self._reading_counter += 1
-                    reading_id = self._reading_counter
-                    reading = self.sensor.read(crate_id=crate_id, reading_id=reading_id)
-                    # Insert into DB
-                    self.db.insert_sensor_reading(SensorReadingRecord(
-                        reading_id=reading.reading_id,
-                        crate_id=reading.crate_id,
-                        recorded_at=reading.recorded_at.isoformat(),
-                        temperature_c=reading.temperature_c,
-                        humidity_pct=reading.humidity_pct,
-                        uploaded=0,
-                    ))
+                # Timestamp for the event, as naive UTC like the image timestamps
+                captured_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None).isoformat()
+                # Capture sensor reading first, so a camera failure cannot lose it
+                reading_record = self._read_sensor(crate_id)
                 # Capture images
-                out_dir = Path(self.config.image_dir)
-                images = self.camera.capture_burst(event_local_id=event_id, out_dir=out_dir, burst_size=self.config.burst_size)
-                # Determine camera name from config.extra or use default
-                camera_name = self.config.extra.get('camera_name', 'camera_0')
-                # Insert capture event metadata
-                self.db.insert_event(CaptureEventRecord(
-                    event_id=event_id,
-                    crate_id=crate_id,
-                    camera_name=camera_name,
-                    captured_at=captured_at,
-                    burst_size=len(images),
-                    uploaded=0,
-                ))
-                # Insert images into DB
-                for img in images:
-                    self.db.insert_image(CapturedImageRecord(
+                try:
+                    burst = self.camera.capture_burst(event_local_id=event_id, out_dir=self._image_dir, burst_size=self._burst_size)
+                except Exception:
+                    if reading_record is not None:
+                        self.db.insert_sensor_reading(reading_record)
+                    raise
+                # All frames share the burst timestamp. Stored as naive UTC
+                # ISO-8601, like event timestamps and rows written before
+                # cameras returned timezone-aware datetimes.
+                images_captured_at = burst.captured_at.replace(tzinfo=None).isoformat()
+                image_records = [
+                    CapturedImageRecord(
                         id=None,
                         event_local_id=event_id,
-                        image_index=img.image_index,
-                        local_path=img.local_path,
-                        captured_at=img.captured_at.isoformat(),
-                        size_bytes=img.size_bytes,
-                        sha256_hex=img.sha256_hex,
-                        width_px=img.width_px,
-                        height_px=img.height_px,
-                        format=img.format,
+                        image_index=idx,
+                        local_path=path,
+                        captured_at=images_captured_at,
+                        size_bytes=size,
+                        sha256_hex=content_hash,
+                        width_px=width,
+                        height_px=height,
+                        format=fmt,
                         metadata_uploaded=0,
                         uploaded=0,
                         local_exists=1,
                         corrupted=0,
-                    ))
-                logging.info(f'Captured event {event_id} with {len(images)} images')
+                        hash_algo=burst.hash_algo,
+                    )
+                    for idx, path, size, content_hash, width, height, fmt in zip(
+                        burst.image_indices, burst.paths, burst.sizes, burst.hashes,
+                        burst.widths, burst.heights, burst.formats,
+                    )
+                ]
+                # Event, images and sensor reading are committed together
+                self.db.insert_capture(
+                    CaptureEventRecord(
+                        event_id=event_id,
+                        crate_id=crate_id,
+                        camera_name=self._camera_name,
+                        captured_at=captured_at,
+                        burst_size=len(burst),
+                        uploaded=0,
+                    ),
+                    image_records,
+                    reading=reading_record,
+                )
+                self._last_event_id = event_id
+                logging.info('Captured event %s with %d images', event_id, len(burst))
             except Exception as exc:
                 logging.exception('Capture loop error: %s', exc)
             # Sleep until next capture
-            self._stop_event.wait(self.config.capture_interval)
+            deadline = self._wait_next(deadline, self._capture_interval)
 
     def heartbeat_loop(self) -> None:
         """Periodically send heartbeat to server and update safe delete watermark."""
+        deadline = time.monotonic()
         while not self._stop_event.is_set():
             try:
-                last_event_id = self._get_max_id('capture_events_local', 'event_id')
+                last_event_id = self._last_event_id
                 safe_id = self.sync_client.send_heartbeat(last_event_id=last_event_id)
                 if safe_id is not None:
                     self.db.set_state_value('delete_safe_up_to_event_id', str(safe_id))
-                    logging.info(f'Heartbeat successful; safe delete up to event_id {safe_id}')
+                    logging.info('Heartbeat successful; safe delete up to event_id %s', safe_id)
             except Exception as exc:
                 logging.exception('Heartbeat loop error: %s', exc)
-            self._stop_event.wait(self.config.heartbeat_interval)
+            deadline = self._wait_next(deadline, self._heartbeat_interval)
+
+    def _sync_events(self) -> None:
+        """Upload metadata for pending capture events and their images."""
+        events = self.db.get_unsynced_events_with_images(limit=5)
+        if not events:
+            return
+        payload = []
+        for event, images in events.values():
+            event_meta: Dict[str, Any] = {
+                'device_id': self._device_id,
+                'event_local_id': event['event_id'],
+                'crate_id': event['crate_id'],
+                'camera_name': event['camera_name'],
+                'captured_at': event['captured_at'],
+                'burst_size': event['burst_size'],
+                'images': [
+                    {
+                        'image_index': img['image_index'],
+                        'size_bytes': img['size_bytes'],
+                        'sha256_hex': img['sha256_hex'],
+                        'hash_algo': img['hash_algo'],
+                        'width_px': img['width_px'],
+                        'height_px': img['height_px'],
+                        'format': img['format'],
+                    } for img in images
+                ],
+            }
+            payload.append(event_meta)
+        if self.sync_client.upload_metadata(events_payload=payload):
+            for event_id in events:
+                self.db.mark_event_uploaded(event_id)
+                self.db.mark_image_metadata_uploaded(event_id)
+            logging.info('Uploaded metadata for %d events', len(events))
+
+    def _sync_readings(self) -> None:
+        """Upload pending sensor readings."""
+        readings = self.db.get_sensor_readings(uploaded=0, limit=10)
+        if not readings:
+            return
+        sensor_payload = [{
+            'device_id': self._device_id,
+            'reading_local_id': r['reading_id'],
+            'crate_id': r['crate_id'],
+            'recorded_at': r['recorded_at'],
+            'temperature_c': r['temperature_c'],
+            'humidity_pct': r['humidity_pct'],
+        } for r in readings]
+        if self.sync_client.upload_metadata(events_payload=sensor_payload):
+            for r in readings:
+                self.db.mark_reading_uploaded(r['reading_id'])
+            logging.info('Uploaded %d sensor readings', len(readings))
+
+    def _sync_images(self) -> None:
+        """Upload binaries for images whose metadata is already on the server."""
+        images = self.db.get_unsynced_images(limit=16)
+        if not images:
+            return
+        results = self.sync_client.upload_images_batch(images)
+        for img, result in zip(images, results):
+            if result:
+                self.db.mark_image_uploaded(img['event_local_id'], img['image_index'])
+                logging.debug('Uploaded image %s', img['local_path'])
+            elif result is False:
+                # Rejected by the server; mark as corrupted to avoid infinite retries
+                self.db.mark_image_corrupted(img['id'])
+            # None: transient failure, retried on the next sync round
 
     def sync_loop(self) -> None:
-        """Periodically upload metadata and images to the server."""
+        """Periodically upload metadata and images to the server.
+
+        Event metadata, sensor readings and image binaries are independent
+        uploads, so each round runs them concurrently on ``_sync_pool`` and
+        overlaps their network round-trips instead of paying them in series.
+        """
+        deadline = time.monotonic()
         while not self._stop_event.is_set():
-            try:
-                # Upload metadata for events
-                events = self.db.get_unsynced_events(limit=5)
-                if events:
-                    payload = []
-                    for event in events:
-                        images = self.db.get_images_for_event(event['event_id'])
-                        event_meta: Dict[str, Any] = {
-                            'device_id': self.config.device_id,
-                            'event_local_id': event['event_id'],
-                            'crate_id': event['crate_id'],
-                            'camera_name': event['camera_name'],
-                            'captured_at': event['captured_at'],
-                            'burst_size': event['burst_size'],
-                            'images': [
-                                {
-                                    'image_index': img['image_index'],
-                                    'size_bytes': img['size_bytes'],
-                                    'sha256_hex': img['sha256_hex'],
-                                    'width_px': img['width_px'],
-                                    'height_px': img['height_px'],
-                                    'format': img['format'],
-                                } for img in images
-                            ],
-                        }
-                        payload.append(event_meta)
-                    if self.sync_client.upload_metadata(events_payload=payload):
-                        for event in events:
-                            self.db.mark_event_uploaded(event['event_id'])
-                            self.db.mark_image_metadata_uploaded(event['event_id'])
-                        logging.info(f'Uploaded metadata for {len(events)} events')
-                # Upload sensor readings metadata separately
-                readings = self.db.get_sensor_readings(uploaded=0, limit=10)
-                if readings:
-                    sensor_payload = [{
-                        'device_id': self.config.device_id,
-                        'reading_local_id': r['reading_id'],
-                        'crate_id': r['crate_id'],
-                        'recorded_at': r['recorded_at'],
-                        'temperature_c': r['temperature_c'],
-                        'humidity_pct': r['humidity_pct'],
-                    } for r in readings]
-                    if self.sync_client.upload_metadata(events_payload=sensor_payload):
-                        for r in readings:
-                            self.db.mark_reading_uploaded(r['reading_id'])
-                        logging.info(f'Uploaded {len(readings)} sensor readings')
-                # Upload image binaries
-                images = self.db.get_unsynced_images(limit=3)
-                for img in images:
-                    success = self.sync_client.upload_image(
-                        event_local_id=img['event_local_id'],
-                        image_index=img['image_index'],
-                        image_path=img['local_path'],
-                        sha256_hex=img['sha256_hex'],
-                    )
-                    if success:
-                        self.db.mark_image_uploaded(img['event_local_id'], img['image_index'])
-                        logging.info(f'Uploaded image {img["local_path"]}')
-                    else:
-                        # Mark as corrupted to avoid infinite retries
-                        self.db.mark_image_corrupted(img['id'])
-            except Exception as exc:
-                logging.exception('Sync loop error: %s', exc)
-            self._stop_event.wait(self.config.sync_interval)
+            tasks = [
+                ('events', self._sync_events),
+                ('readings', self._sync_readings),
+                ('images', self._sync_images),
+            ]
+            futures = [(name, self._sync_pool.submit(task)) for name, task in tasks]
+            for name, future in futures:
+                try:
+                    future.result()
+                except Exception as exc:
+                    logging.exception('Sync loop error (%s): %s', name, exc)
+            deadline = self._wait_next(deadline, self._sync_interval)
 
     def cleanup_loop(self) -> None:
         """Periodically delete local image files that are safe to remove."""
+        deadline = time.monotonic()
         while not self._stop_event.is_set():
             try:
                 safe_id_str = self.db.get_state_value('delete_safe_up_to_event_id')
@@ -343,23 +452,28 @@ class SmartLarvaEdge:
                     safe_id = int(safe_id_str)
                     candidates = self.db.get_cleanup_candidates(
                         safe_delete_event_id=safe_id,
-                        retention_days=self.config.retention_days,
+                        retention_days=self._retention_days,
                         limit=20
                     )
+                    deleted_ids = []
                     for img in candidates:
                         path = img['local_path']
                         try:
-                            if os.path.exists(path):
-                                os.remove(path)
-                            self.db.mark_image_deleted(img['id'])
-                            logging.info(f'Cleaned up image {path}')
+                            os.unlink(path)
+                        except FileNotFoundError:
+                            pass  # already gone; still mark it deleted
                         except Exception as exc:
-                            logging.error(f'Failed to delete {path}: {exc}')
+                            logging.error('Failed to delete %s: %s', path, exc)
+                            continue
+                        deleted_ids.append(img['id'])
+                        logging.info('Cleaned up image %s', path)
+                    if deleted_ids:
+                        self.db.mark_images_deleted(deleted_ids)
                 else:
                     logging.debug('No safe delete watermark yet')
             except Exception as exc:
                 logging.exception('Cleanup loop error: %s', exc)
-            self._stop_event.wait(self.config.cleanup_interval)
+            deadline = self._wait_next(deadline, self._cleanup_interval)
 
     def start(self) -> None:
         """Start all background threads."""
@@ -375,12 +489,27 @@ class SmartLarvaEdge:
             t.start()
             self._threads.append(t)
 
+    def wait(self) -> None:
+        """Block until ``stop()`` has been requested."""
+        self._stop_event.wait()
+
     def stop(self) -> None:
-        """Signal threads to stop and wait for completion."""
+        """Signal threads to stop and wait for completion.
+
+        Safe to call more than once (e.g. on repeated signals); only the
+        first call shuts anything down.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
         self._stop_event.set()
         for t in self._threads:
             t.join(timeout=5.0)
+        self._sync_pool.shutdown(wait=True)
+        self.camera.close()
         self.db.close()
+        # Flush queued log records last, so shutdown messages are written
+        self._log_listener.stop()
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='SmartLarva Edge Service')
@@ -395,14 +524,12 @@ def main() -> None:
     def handle_sigterm(signum, frame):
         logging.info('Shutting down...')
         service.stop()
-        sys.exit(0)
 
     signal.signal(signal.SIGINT, handle_sigterm)
     signal.signal(signal.SIGTERM, handle_sigterm)
     service.start()
-    # Keep the main thread alive
-    while True:
-        time.sleep(1)
+    # Sleep until a signal handler stops the service, then return normally
+    service.wait()
 
 if __name__ == '__main__':
     main()
@@ -5,8 +5,10 @@ DHT22 sensor backend using Adafruit_DHT.
 This module provides an example implementation for reading data from a
 DHT22 or similar temperature/humidity sensor. It uses the Adafruit_DHT
 library, which must be installed on the Raspberry Pi (e.g., via pip).
-If the library or sensor is not available, the ``read`` method will raise
-a RuntimeError.
+The library is imported when the first ``DHT22Sensor`` is created, so this
+module can be imported anywhere; constructing a sensor raises ImportError if
+the library is missing, and ``read`` raises RuntimeError if the sensor does
+not respond.
 """
 
 from __future__ import annotations
@@ -14,7 +16,8 @@ import datetime
 from typing import Optional
 from dataclasses import dataclass
 
-import Adafruit_DHT
+# Adafruit_DHT module, imported on first use by DHT22Sensor
+_adafruit = None
 
 @dataclass
 class SensorReading:
@@ -28,7 +31,16 @@ class DHT22Sensor:
     """DHT22 sensor backend."""
 
     def __init__(self, pin: int) -> None:
-        self.sensor = Adafruit_DHT.DHT22
+        """Create a sensor on GPIO ``pin``.
+
+        Raises:
+            ImportError: if the Adafruit_DHT library is not installed.
+        """
+        global _adafruit
+        if _adafruit is None:
+            import Adafruit_DHT as _adafruit
+        self._mod = _adafruit
+        self.sensor = _adafruit.DHT22
         self.pin = pin
 
     def read(self, crate_id: int, reading_id: int) -> SensorReading:
@@ -44,7 +56,7 @@ class DHT22Sensor:
         Raises:
             RuntimeError: if reading fails or sensor returns None values.
         """
-        humidity, temperature = Adafruit_DHT.read_retry(self.sensor, self.pin)
+        humidity, temperature = self._mod.read_retry(self.sensor, self.pin)
         if humidity is None or temperature is None:
             raise RuntimeError('Failed to read from DHT22 sensor')
         return SensorReading(
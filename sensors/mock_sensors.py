@@ -25,6 +25,11 @@ class SensorReading:
 class MockSensor:
     """Mock sensor returning random temperature and humidity."""
 
+    def __init__(self) -> None:
+        # Private generator, so concurrent mock sensors do not contend on the
+        # shared module-level ``random`` state
+        self._rng = random.Random()
+
     def read(self, crate_id: int, reading_id: int) -> SensorReading:
         """Return a simulated sensor reading for a crate.
 
@@ -36,8 +41,8 @@ class MockSensor:
             A SensorReading dataclass instance.
         """
         now = datetime.datetime.utcnow()
-        temperature = round(random.uniform(18.0, 25.0), 2)
-        humidity = round(random.uniform(40.0, 70.0), 2)
+        temperature = round(self._rng.uniform(18.0, 25.0), 2)
+        humidity = round(self._rng.uniform(40.0, 70.0), 2)
         return SensorReading(
             reading_id=reading_id,
             crate_id=crate_id,
@@ -12,31 +12,256 @@ The API endpoints are assumed to be:
   The server responds with a JSON containing at least ``{ "delete_safe_up_to_event_id": ... }``.
 
 - POST ``/api/upload/metadata`` with JSON describing events and sensor readings.
-  See the protocol specification for field details.
+  See the protocol specification for field details. When the client is created
+  with ``compress_metadata=True`` the body is gzip-compressed
+  (``Content-Encoding: gzip``); the server must accept that encoding.
 
 - PUT ``/api/upload/image/{device_id}/{event_local_id}/{image_index}`` with binary body.
-  The request must include a SHA-256 checksum header ``X-Checksum-SHA256`` for verification.
+  The request must include a checksum header for verification: ``X-Checksum-SHA256``
+  by default, or ``X-Checksum-XXH3-128`` when the device is configured with
+  ``hash_algo: xxh3_128``.
+
+- PUT ``/api/upload/images/{device_id}`` with a ``multipart/form-data`` body
+  carrying several images at once. Each image part is named ``image_<n>`` and
+  carries its checksum header; a ``manifest`` part holds a JSON list of
+  ``{ "field", "event_local_id", "image_index", "checksum", "hash_algo" }``.
+  The server may respond with ``{ "results": [{ "event_local_id", "image_index",
+  "ok" }, ...] }``; if it does not, a 2xx response means every image succeeded.
+  If the server answers 404, 405 or 501 the endpoint is assumed missing and the
+  client falls back to the per-image PUT above.
+
+Image uploads distinguish an explicit rejection (a 4xx response, or
+``"ok": false`` for that image) from a transient failure (a transport error,
+a timeout, a 5xx, 408 or 429 response, or no verdict for the image), so the
+caller can retry the latter instead of giving up on the image.
 
 These details may need to be adjusted to match your actual server implementation.
 """
 
 from __future__ import annotations
 
+import gzip
+import json
 import logging
-from typing import Dict, Any, List, Optional
+import queue
+import time
+import uuid
+from contextlib import ExitStack
+from typing import Callable, Dict, Any, List, Mapping, Optional, Sequence, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:  # optional dependency
+    MultipartEncoder = None
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+from ..camera.base import drop_page_cache
+
+
+# Transient gateway errors retried with exponential backoff
+_RETRY_STATUSES = (502, 503, 504)
+_RETRIES = 3
+_BACKOFF = 0.5
+
+
+def _checksum_header(hash_algo: str) -> str:
+    """Return the checksum header name for a hash algorithm."""
+    return f'X-Checksum-{hash_algo.upper().replace("_", "-")}'
+
+
+def _upload_verdict(status_code: int) -> Optional[bool]:
+    """Classify an image upload response.
+
+    Returns True on success, False if the server rejected the image, and
+    None if the failure is transient and the upload should be retried later.
+    """
+    if 200 <= status_code < 300:
+        return True
+    if 400 <= status_code < 500 and status_code not in (408, 429):
+        return False
+    return None
+
+
+def _dumps_json(obj: Any) -> bytes:
+    """Serialize ``obj`` to UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+class _MultipartStream:
+    """Read-only ``multipart/form-data`` body that streams file parts from disk.
+
+    Stand-in for ``requests_toolbelt.MultipartEncoder`` when it is not
+    installed, so a batch upload never holds every image in memory. Accepts
+    the same ``fields``: ``(name, text)`` or ``(name, (filename, file,
+    content_type, headers))`` with files positioned at their start. The total
+    length is known up front, so the request carries a ``Content-Length``.
+    """
+
+    def __init__(self, fields: Sequence[Any]) -> None:
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._parts: List[Any] = []  # bytes, or open files read to EOF
+        self._len = 0
+        for name, value in fields:
+            if isinstance(value, tuple):
+                filename, f, part_type, part_headers = value
+                head = (
+                    f'--{boundary}\r\n'
+                    f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                    f'Content-Type: {part_type}\r\n'
+                    + ''.join(f'{k}: {v}\r\n' for k, v in part_headers.items())
+                    + '\r\n'
+                )
+                self._add(head.encode())
+                self._parts.append(f)
+                self._len += os.fstat(f.fileno()).st_size
+            else:
+                head = f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                self._add(head.encode())
+                self._add(value.encode())
+            self._add(b'\r\n')
+        self._add(f'--{boundary}--\r\n'.encode())
+        self._index = 0  # current part
+        self._offset = 0  # position within the current bytes part
+
+    def _add(self, data: bytes) -> None:
+        self._parts.append(data)
+        self._len += len(data)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def read(self, size: int = -1) -> bytes:
+        """Return up to ``size`` bytes of the body (all remaining if negative)."""
+        chunks = []
+        while self._index < len(self._parts) and size != 0:
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                end = len(part) if size < 0 else self._offset + size
+                chunk = part[self._offset:end]
+                self._offset += len(chunk)
+                if self._offset >= len(part):
+                    self._index += 1
+                    self._offset = 0
+            else:
+                chunk = part.read(size)
+                if size < 0 or len(chunk) < size:
+                    self._index += 1
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+
+class BufferPool:
+    """Pool of reusable, fixed-size ``bytearray`` buffers for image uploads.
+
+    Reading each image into a fresh ``bytes`` object allocates megabytes per
+    upload, which CPython's allocator is slow to hand back to the OS. Buffers
+    are allocated on demand and returned to a LIFO queue after use (so the
+    most recently used, cache-warm buffer is handed out next); at most
+    ``capacity`` idle buffers are retained.
+    """
+
+    def __init__(self, buffer_size: int = 4 * 1024 * 1024, capacity: int = 2) -> None:
+        self.buffer_size = buffer_size
+        self._buffers: queue.LifoQueue = queue.LifoQueue(maxsize=capacity)
+
+    def get(self) -> bytearray:
+        """Check out a buffer, allocating a new one if none is idle."""
+        try:
+            return self._buffers.get_nowait()
+        except queue.Empty:
+            return bytearray(self.buffer_size)
+
+    def put(self, buf: bytearray) -> None:
+        """Return a buffer to the pool; it is dropped if the pool is full."""
+        try:
+            self._buffers.put_nowait(buf)
+        except queue.Full:
+            pass
+
+
 class SyncClient:
     """HTTP client for synchronizing edge data with the server."""
 
-    def __init__(self, base_url: str, device_id: str, timeout: int = 10) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        device_id: str,
+        timeout: int = 10,
+        compress_metadata: bool = False,
+        buffer_pool: Optional[BufferPool] = None,
+    ) -> None:
         self.base_url = base_url.rstrip('/')
         self.device_id = device_id
         self.timeout = timeout
+        self.compress_metadata = compress_metadata
+        # Reusable read buffers for ``upload_image``; None streams every file
+        self.buffer_pool = buffer_pool
         self.session = requests.Session()
+        # Keep connections alive across calls and threads, and retry transient
+        # gateway errors with backoff. PUT is left out: image bodies are
+        # streamed and urllib3 cannot always rewind them, so a retried PUT
+        # could go out without its body. ``_put_with_retries`` retries PUTs
+        # with a freshly built body instead.
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=_RETRIES,
+                backoff_factor=_BACKOFF,
+                status_forcelist=_RETRY_STATUSES,
+                allowed_methods=frozenset({'GET', 'POST'}),
+            ),
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Cleared when the server lacks the batch image endpoint
+        self._batch_supported = True
         self.logger = logging.getLogger(__name__)
 
+    def _put_with_retries(
+        self, url: str, build: Callable[[], Tuple[Any, Dict[str, str]]]
+    ) -> requests.Response:
+        """PUT to ``url``, retrying transient failures with a rebuilt body.
+
+        ``build`` returns ``(data, headers)`` and is called once per attempt,
+        so streamed bodies start from the beginning every time. Connection
+        errors, timeouts and 502/503/504 responses are retried with
+        exponential backoff.
+
+        Returns:
+            The last response received.
+
+        Raises:
+            requests.RequestException: the last transport error, once
+                retries are exhausted.
+        """
+        for attempt in range(_RETRIES):
+            data, headers = build()
+            try:
+                response = self.session.put(url, data=data, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                pass
+            else:
+                if response.status_code not in _RETRY_STATUSES:
+                    return response
+                response.close()
+            time.sleep(_BACKOFF * 2 ** attempt)
+        data, headers = build()
+        return self.session.put(url, data=data, headers=headers, timeout=self.timeout)
+
     def send_heartbeat(self, last_event_id: Optional[int]) -> Optional[int]:
         """Send a heartbeat to the server.
 
@@ -71,35 +296,200 @@ class SyncClient:
         """
         url = f'{self.base_url}/api/upload/metadata'
         try:
-            response = self.session.post(url, json=events_payload, timeout=self.timeout)
+            body = _dumps_json(events_payload)
+            headers = {'Content-Type': 'application/json'}
+            if self.compress_metadata:
+                body = gzip.compress(body)
+                headers['Content-Encoding'] = 'gzip'
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
             response.raise_for_status()
             return True
         except Exception as exc:
             self.logger.error('Metadata upload failed: %s', exc)
             return False
 
-    def upload_image(self, event_local_id: int, image_index: int, image_path: str, sha256_hex: str) -> bool:
+    def upload_image(
+        self,
+        event_local_id: int,
+        image_index: int,
+        image_path: str,
+        sha256_hex: str,
+        hash_algo: str = 'sha256',
+    ) -> Optional[bool]:
         """Upload a single image to the server.
 
+        The service uploads through ``upload_images_batch``; this per-image
+        PUT is its fallback for servers without the batch endpoint. The file
+        is sent from a pooled buffer or streamed from disk, always with an
+        explicit ``Content-Length``.
+
         Args:
             event_local_id: local event identifier.
             image_index: index within the burst.
             image_path: path to the image file.
-            sha256_hex: precomputed SHA-256 checksum.
+            sha256_hex: precomputed content hash (SHA-256 unless ``hash_algo`` says otherwise).
+            hash_algo: algorithm of ``sha256_hex``, e.g. ``'sha256'`` or ``'xxh3_128'``.
 
         Returns:
-            True if upload succeeded, False otherwise.
+            True if the upload succeeded, False if the server rejected the
+            image or the file cannot be read, and None if the upload failed
+            transiently and should be retried later.
         """
         url = f'{self.base_url}/api/upload/image/{self.device_id}/{event_local_id}/{image_index}'
         headers = {
-            'X-Checksum-SHA256': sha256_hex,
+            _checksum_header(hash_algo): sha256_hex,
         }
         try:
+            # An explicit Content-Length avoids chunked transfer encoding,
+            # which some servers reject.
             with open(image_path, 'rb') as f:
-                data = f.read()
-            response = self.session.put(url, headers=headers, data=data, timeout=self.timeout)
-            response.raise_for_status()
-            return True
-        except Exception as exc:
+                size = os.fstat(f.fileno()).st_size
+                headers['Content-Length'] = str(size)
+                pool = self.buffer_pool
+                if pool is not None and size <= pool.buffer_size:
+                    # Read into a pooled buffer instead of allocating a new one
+                    buf = pool.get()
+                    try:
+                        n = f.readinto(buf)
+                        body = memoryview(buf)[:n]
+                        response = self._put_with_retries(url, lambda: (body, headers))
+                    finally:
+                        pool.put(buf)
+                else:
+                    # Stream files that do not fit a pooled buffer from disk,
+                    # rewinding before each attempt
+                    def _build():
+                        f.seek(0)
+                        return f, headers
+
+                    response = self._put_with_retries(url, _build)
+                # The body has been sent, so the file's pages are clean
+                drop_page_cache(f.fileno())
+        except requests.RequestException as exc:
+            self.logger.warning('Image upload for %s will be retried: %s', image_path, exc)
+            return None
+        except OSError as exc:
             self.logger.error('Image upload failed for %s: %s', image_path, exc)
             return False
+        verdict = _upload_verdict(response.status_code)
+        if not verdict:
+            self.logger.error(
+                'Image upload failed for %s: HTTP %d', image_path, response.status_code
+            )
+        return verdict
+
+    def upload_images_batch(self, images: Sequence[Mapping[str, Any]]) -> List[Optional[bool]]:
+        """Upload several images in one multipart request.
+
+        Image bodies are streamed from disk, by ``requests_toolbelt`` when it
+        is installed and by ``_MultipartStream`` otherwise.
+        If the server has no batch endpoint, the images are sent one at a time
+        with ``upload_image`` instead.
+
+        Args:
+            images: Image rows (e.g. from ``Database.get_unsynced_images``) with
+                ``event_local_id``, ``image_index``, ``local_path``,
+                ``sha256_hex`` and ``hash_algo`` keys.
+
+        Returns:
+            One result per input image, in order: True if the server accepted
+            it, False if the server rejected it or the file cannot be read, and
+            None if the upload failed transiently and should be retried later.
+        """
+        if not self._batch_supported:
+            return self._upload_images_individually(images)
+        url = f'{self.base_url}/api/upload/images/{self.device_id}'
+        status: List[Optional[bool]] = [None] * len(images)
+        with ExitStack() as stack:
+            fields = []
+            manifest = []
+            sent = []  # positions in ``images`` included in the request
+            for pos, img in enumerate(images):
+                path = img['local_path']
+                try:
+                    f = stack.enter_context(open(path, 'rb'))
+                except OSError as exc:
+                    self.logger.error('Image upload failed for %s: %s', path, exc)
+                    status[pos] = False
+                    continue
+                name = f'image_{len(sent)}'
+                fields.append((name, (
+                    os.path.basename(path), f, 'application/octet-stream',
+                    {_checksum_header(img['hash_algo']): img['sha256_hex']},
+                )))
+                manifest.append({
+                    'field': name,
+                    'event_local_id': img['event_local_id'],
+                    'image_index': img['image_index'],
+                    'checksum': img['sha256_hex'],
+                    'hash_algo': img['hash_algo'],
+                })
+                sent.append(pos)
+            if not sent:
+                return status
+            manifest_json = _dumps_json(manifest).decode()
+            encoder_cls = MultipartEncoder if MultipartEncoder is not None else _MultipartStream
+
+            def _build():
+                # Encoders cannot be rewound, so each attempt gets a new one
+                for _, (_, f, _, _) in fields:
+                    f.seek(0)
+                body = encoder_cls(fields=[('manifest', manifest_json)] + fields)
+                return body, {'Content-Type': body.content_type}
+
+            try:
+                response = self._put_with_retries(url, _build)
+            except requests.RequestException as exc:
+                self.logger.warning(
+                    'Batch image upload will be retried (%d images): %s', len(sent), exc
+                )
+                return status
+            # The bodies have been sent, so the files' pages are clean
+            for _, (_, f, _, _) in fields:
+                drop_page_cache(f.fileno())
+        if response.status_code in (404, 405, 501):
+            self.logger.warning(
+                'Server has no batch image endpoint (HTTP %d); uploading images one at a time',
+                response.status_code,
+            )
+            self._batch_supported = False
+            individual = self._upload_images_individually([images[pos] for pos in sent])
+            for pos, verdict in zip(sent, individual):
+                status[pos] = verdict
+            return status
+        if not 200 <= response.status_code < 300:
+            # A batch-level error says nothing about individual images
+            self.logger.warning(
+                'Batch image upload will be retried (%d images): HTTP %d',
+                len(sent), response.status_code,
+            )
+            return status
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        results = body.get('results') if isinstance(body, dict) else None
+        if not isinstance(results, list):
+            for pos in sent:
+                status[pos] = True
+            return status
+        verdicts = {
+            (r.get('event_local_id'), r.get('image_index')): bool(r.get('ok'))
+            for r in results if isinstance(r, dict)
+        }
+        for pos in sent:
+            # Images the server did not report on are retried later
+            status[pos] = verdicts.get((images[pos]['event_local_id'], images[pos]['image_index']))
+        return status
+
+    def _upload_images_individually(
+        self, images: Sequence[Mapping[str, Any]]
+    ) -> List[Optional[bool]]:
+        """Upload images one request at a time with ``upload_image``."""
+        return [
+            self.upload_image(
+                img['event_local_id'], img['image_index'], img['local_path'],
+                img['sha256_hex'], img['hash_algo'],
+            )
+            for img in images
+        ]